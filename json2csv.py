@@ -45,12 +45,25 @@ SOFTWARE.
 __version__ = "0.1.0"
 
 import argparse
-import csv
+import codecs
+import errno
+import functools
+import itertools
 import json
+import mmap
+import os
+import re
+import stat
 import sys
+from collections import deque
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Generator, List, Tuple, Union
+from typing import Any, Dict, Generator, List, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # CONSTANTS
 
@@ -61,6 +74,30 @@ KEY_SEPARATOR = "_"
 INDEX_FORMAT = "{:04d}"
 CSV_HEADERS = ["key", "value"]
 MAX_KEY_LENGTH = 256
+INDEX_TABLE_SIZE = 10000
+CSV_BATCH_SIZE = 8192
+WRITE_BUFFER_SIZE = 1 << 20
+MMAP_THRESHOLD = 1 << 20
+_FORBIDDEN_RE = re.compile(r"[,\n\r]")
+_SANITIZE_TABLE = str.maketrans(dict.fromkeys(",\n\r", "_"))
+_QUOTE_RE = re.compile(r'[,"\n\r]')
+_PLAIN_TYPES = frozenset({int, float, bool})
+_DIGIT_TABLE = bytes.maketrans(b"123456789", b"000000000")
+_LONG_DIGIT_RUN = b"0" * 19
+_SCAN_CHUNK_SIZE = 1 << 20
+_MISSING_PATH_ERRNOS = frozenset(
+    {errno.ENOENT, errno.ENOTDIR, errno.EBADF, errno.ELOOP}
+)
+_DICT_NODE, _LIST_NODE, _LEAF_NODE = 0, 1, 2
+_NODE_KINDS = {
+    dict: _DICT_NODE,
+    list: _LIST_NODE,
+    str: _LEAF_NODE,
+    int: _LEAF_NODE,
+    float: _LEAF_NODE,
+    bool: _LEAF_NODE,
+    type(None): _LEAF_NODE,
+}
 
 
 # ARGUMENT PARSER
@@ -104,6 +141,25 @@ def parse_arguments() -> argparse.Namespace:
         default=False,
         help="Validate keys for CSV compatibility",
     )
+    parser.add_argument(
+        "--write-buffer",
+        type=int,
+        default=WRITE_BUFFER_SIZE,
+        help="Output write buffer size in bytes (default: 1 MiB)",
+    )
+    parser.add_argument(
+        "--durable",
+        action="store_true",
+        default=False,
+        help="Flush and fsync the output file once writing has finished",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)",
+    )
     parser.add_argument(
         "--version",
         "-v",
@@ -114,7 +170,7 @@ def parse_arguments() -> argparse.Namespace:
     args = parser.parse_args()
 
     # Validate separator
-    if any(c in args.separator for c in {",", "\n", "\r"}):
+    if _FORBIDDEN_RE.search(args.separator) is not None:
         raise ValueError("Separator cannot be empty, a comma, or a newline!")
 
     # Validate index format
@@ -123,6 +179,14 @@ def parse_arguments() -> argparse.Namespace:
     except ValueError as error:
         raise ValueError(f"Invalid index format: {error}")
 
+    # Validate write buffer size
+    if args.write_buffer <= 0:
+        raise ValueError("Write buffer size must be a positive integer!")
+
+    # Validate number of jobs
+    if args.jobs is not None and args.jobs <= 0:
+        raise ValueError("Number of jobs must be a positive integer!")
+
     return args
 
 
@@ -131,16 +195,27 @@ def parse_arguments() -> argparse.Namespace:
 
 def get_json_files(path: Path) -> List[Path]:
     """Collect all JSON files from the specified path"""
-    if not path.exists():
-        raise FileNotFoundError(f"Path does not exist: {path}")
-
-    if path.is_file():
+    try:
+        mode = os.stat(path).st_mode
+    except OSError as error:
+        # Same errnos Path.exists() treats as missing, e.g. symlink loops
+        if error.errno in _MISSING_PATH_ERRNOS:
+            raise FileNotFoundError(f"Path does not exist: {path}")
+        raise FileNotFoundError(f"Cannot access {path}: {error}")
+
+    if stat.S_ISREG(mode):
         if path.suffix.lower() == JSON_EXTENSION:
             return [path]
         raise FileNotFoundError(f"Not a {JSON_EXTENSION} file: {path}")
 
-    if path.is_dir():
-        files = list(path.glob(f"*{JSON_EXTENSION}"))
+    if stat.S_ISDIR(mode):
+        with os.scandir(path) as entries:
+            files = [
+                Path(entry.path)
+                for entry in entries
+                if entry.name.lower().endswith(JSON_EXTENSION)
+                and entry.is_file()
+            ]
         if not files:
             raise FileNotFoundError(f"No JSON files found in: {path}")
         return files
@@ -148,17 +223,62 @@ def get_json_files(path: Path) -> List[Path]:
     raise ValueError(f"Invalid path: {path}")
 
 
+def _has_long_digit_run(content: Union[bytes, mmap.mmap]) -> bool:
+    """Check for a run of 19+ digits, i.e. a possible 64-bit overflow"""
+    overlap = len(_LONG_DIGIT_RUN) - 1
+    for start in range(0, len(content), _SCAN_CHUNK_SIZE):
+        chunk = content[max(start - overlap, 0) : start + _SCAN_CHUNK_SIZE]
+        if _LONG_DIGIT_RUN in chunk.translate(_DIGIT_TABLE):
+            return True
+    return False
+
+
+def _load_with_json(path: Path) -> Any:
+    """Parse a JSON file with the standard library json module"""
+    with path.open("r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _load_with_orjson(path: Path) -> Any:
+    """Parse a JSON file with orjson, memory-mapping large files"""
+    # orjson turns integers wider than 64 bits into floats, so files that
+    # may contain one are left to json, which keeps them exact
+    if path.stat().st_size < MMAP_THRESHOLD:
+        content = path.read_bytes()
+        if not _has_long_digit_run(content):
+            return orjson.loads(content)
+    else:
+        with path.open("rb") as file:
+            with mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mapped:
+                if not _has_long_digit_run(mapped):
+                    # The view must be released before the mapping closes
+                    with memoryview(mapped) as view:
+                        return orjson.loads(view)
+
+    return _load_with_json(path)
+
+
 def load_json_data(path: Path) -> Union[Dict, List]:
     """Load and parse JSON data from a file"""
     try:
-        with path.open("r", encoding="utf-8") as file:
-            data = json.load(file)
-
-            if not isinstance(data, (dict, list)):
-                raise ValueError(
-                    f"JSON must be object or array, got {type(data).__name__}"
-                )
-            return data
+        if orjson is None:
+            data = _load_with_json(path)
+        else:
+            try:
+                data = _load_with_orjson(path)
+            except orjson.JSONDecodeError:
+                # orjson rejects some input json accepts (NaN, Infinity,
+                # out-of-range floats, lone surrogates); invalid files
+                # fail again here with json's own error message
+                data = _load_with_json(path)
+
+        if not isinstance(data, (dict, list)):
+            raise ValueError(
+                f"JSON must be object or array, got {type(data).__name__}"
+            )
+        return data
     except json.JSONDecodeError as error:
         raise json.JSONDecodeError(
             f"Invalid JSON in {path}: {error}", error.doc, error.pos
@@ -170,46 +290,181 @@ def load_json_data(path: Path) -> Union[Dict, List]:
 # JSON PROCESSING
 
 
-def flatten_json(
-    data: Union[Dict, List, Any],
-    parent_key: str = PARENT_KEY,
-    separator: str = KEY_SEPARATOR,
-    index_format: str = INDEX_FORMAT,
-    validate_keys: bool = False,
+def _format_index(index: int, index_format: str) -> str:
+    """Format an array index, falling back to plain digits on error"""
+    try:
+        return index_format.format(index)
+    except ValueError:
+        return str(index)
+
+
+@functools.lru_cache(maxsize=8)
+def _index_table(index_format: str) -> Tuple[str, ...]:
+    """Pre-format the first INDEX_TABLE_SIZE array indices"""
+    return tuple(
+        _format_index(index, index_format) for index in range(INDEX_TABLE_SIZE)
+    )
+
+
+def _index_children(
+    node_key: str,
+    node: List,
+    separator: str,
+    index_format: str,
+    default_format: bool,
+) -> List[Tuple[str, Any]]:
+    """Build (key, item) pairs for the elements of a JSON array"""
+    prefix = f"{node_key}{separator}" if node_key else ""
+    children = [
+        (prefix + idx, item)
+        for idx, item in zip(_index_table(index_format), node)
+    ]
+    if len(node) <= INDEX_TABLE_SIZE:
+        return children
+
+    # Indices past the table are formatted one by one; the default
+    # format gets a plain f-string instead of going through str.format
+    tail = enumerate(node[INDEX_TABLE_SIZE:], INDEX_TABLE_SIZE)
+    if default_format:
+        children.extend(
+            [(f"{prefix}{index:04d}", item) for index, item in tail]
+        )
+    else:
+        children.extend(
+            [
+                (prefix + _format_index(index, index_format), item)
+                for index, item in tail
+            ]
+        )
+    return children
+
+
+def _node_kind(node: Any) -> int:
+    """Classify a JSON node whose exact type is not in _NODE_KINDS"""
+    if isinstance(node, dict):
+        return _DICT_NODE
+    if isinstance(node, list):
+        return _LIST_NODE
+    if isinstance(node, (str, int, float, bool)):
+        return _LEAF_NODE
+    raise ValueError(f"Unsupported data type: {type(node).__name__}")
+
+
+def _flatten_fast(
+    roots: List[Any],
+    parent_key: str,
+    separator: str,
+    index_format: str,
 ) -> Generator[Tuple[str, Any], None, None]:
-    """Recursively flattens nested JSON structures"""
+    """Flattens JSON roots sharing one key prefix, without key validation"""
+    default_format = index_format == INDEX_FORMAT
+    stack = [(parent_key, root) for root in reversed(roots)]
+    # Bind the stack methods once; they are called for every node
+    pop = stack.pop
+    push_all = stack.extend
+    node_kinds = _NODE_KINDS
+
+    while stack:
+        node_key, node = pop()
+        kind = node_kinds.get(node.__class__)
+        if kind is None:
+            kind = _node_kind(node)
+
+        if kind == _LEAF_NODE:
+            yield node_key, node
+
+        elif kind == _DICT_NODE:
+            prefix = f"{node_key}{separator}" if node_key else ""
+            # Children are pushed in reverse so they pop in document order.
+            # A non-str key makes the concatenation raise TypeError.
+            try:
+                push_all(
+                    [
+                        (prefix + key, value)
+                        for key, value in reversed(node.items())
+                    ]
+                )
+            except TypeError:
+                bad_key = next(k for k in node if not isinstance(k, str))
+                raise ValueError(
+                    f"Keys must be str, got {type(bad_key).__name__}"
+                )
 
-    if isinstance(data, dict):
-        for key, value in data.items():
+        else:
+            children = _index_children(
+                node_key, node, separator, index_format, default_format
+            )
+            push_all(reversed(children))
+
+
+def _flatten_validated(
+    roots: List[Any],
+    parent_key: str,
+    separator: str,
+    index_format: str,
+) -> Generator[Tuple[str, Any], None, None]:
+    """Flattens JSON roots sharing one key prefix, validating every key"""
+    default_format = index_format == INDEX_FORMAT
+    # Entries are (prefix, key, node, is_dict_key). Dict keys are checked
+    # when their entry is popped, so a key is only validated after every
+    # row of its earlier siblings has been emitted.
+    stack = [(parent_key, "", root, False) for root in reversed(roots)]
+
+    while stack:
+        prefix, key, node, is_dict_key = stack.pop()
+        if is_dict_key:
             if not isinstance(key, str):
                 raise ValueError(f"Keys must be str, got {type(key).__name__}")
-            new_key = f"{parent_key}{separator}{key}" if parent_key else key
-
-            if validate_keys:
-                if len(new_key) > MAX_KEY_LENGTH:
-                    raise ValueError(
-                        f"Key too long (max {MAX_KEY_LENGTH} chars): {new_key}"
-                    )
-                if any(c in new_key for c in {",", "\n", "\r"}):
-                    raise ValueError(f"Key has invalid characters: {new_key}")
-            yield from flatten_json(
-                value, new_key, separator, index_format, validate_keys
+            node_key = prefix + key
+
+            if len(node_key) > MAX_KEY_LENGTH:
+                raise ValueError(
+                    f"Key too long (max {MAX_KEY_LENGTH} chars): {node_key}"
+                )
+            if _FORBIDDEN_RE.search(node_key) is not None:
+                raise ValueError(f"Key has invalid characters: {node_key}")
+        else:
+            node_key = prefix + key
+
+        kind = _NODE_KINDS.get(node.__class__)
+        if kind is None:
+            kind = _node_kind(node)
+
+        if kind == _LEAF_NODE:
+            yield node_key, node
+
+        elif kind == _DICT_NODE:
+            child_prefix = f"{node_key}{separator}" if node_key else ""
+            # Push in reverse so children are emitted in document order
+            stack.extend(
+                [
+                    (child_prefix, child_key, value, True)
+                    for child_key, value in reversed(node.items())
+                ]
             )
 
-    elif isinstance(data, list):
-        for index, item in enumerate(data):
-            try:
-                idx = index_format.format(index)
-            except ValueError:
-                idx = str(index)
-            idx_key = f"{parent_key}{separator}{idx}" if parent_key else idx
-            yield from flatten_json(
-                item, idx_key, separator, index_format, validate_keys
+        else:
+            children = _index_children(
+                node_key, node, separator, index_format, default_format
             )
-    elif isinstance(data, (str, int, float, bool)) or data is None:
-        yield parent_key, data
-    else:
-        raise ValueError(f"Unsupported data type: {type(data).__name__}")
+            stack.extend(
+                [
+                    (idx_key, "", item, False)
+                    for idx_key, item in reversed(children)
+                ]
+            )
+
+
+def flatten_json(
+    data: Union[Dict, List, Any],
+    parent_key: str = PARENT_KEY,
+    separator: str = KEY_SEPARATOR,
+    index_format: str = INDEX_FORMAT,
+    validate_keys: bool = False,
+) -> Generator[Tuple[str, Any], None, None]:
+    """Flattens nested JSON structures using an explicit stack"""
+    flatten = _flatten_validated if validate_keys else _flatten_fast
+    return flatten([data], parent_key, separator, index_format)
 
 
 def process_json_data(
@@ -219,42 +474,131 @@ def process_json_data(
     index_format: str = INDEX_FORMAT,
     validate_keys: bool = False,
 ) -> Generator[Tuple[str, Any], None, None]:
-    """Process JSON data into a list of flattened dictionaries"""
+    """Validate top-level JSON data and return its flattened rows"""
     if isinstance(data, dict):
-        yield from flatten_json(
-            data, file_prefix, separator, index_format, validate_keys
-        )
+        roots = [data]
     elif isinstance(data, list):
         for item in data:
             if not isinstance(item, dict):
                 raise ValueError(f"Must be dicts, got {type(item).__name__}")
-            yield from flatten_json(
-                item, file_prefix, separator, index_format, validate_keys
-            )
+        roots = data
     else:
         raise ValueError("JSON must be an object or array of objects!")
 
+    flatten = _flatten_validated if validate_keys else _flatten_fast
+    return flatten(roots, sys.intern(file_prefix), separator, index_format)
+
+
+def convert_json_file(
+    path: Path,
+    separator: str = KEY_SEPARATOR,
+    index_format: str = INDEX_FORMAT,
+    validate_keys: bool = False,
+) -> Tuple[List[Tuple[str, Any]], Optional[str]]:
+    """Load and flatten a single JSON file in a worker process
+
+    Like the streaming path, rows produced before an error are kept; the
+    error message, if any, is returned alongside them.
+    """
+    # Interning lets repeated keys share one string, which also lets
+    # pickle send each distinct key back to the main process only once
+    intern = sys.intern
+    rows = []
+    try:
+        data = load_json_data(path)
+        # list.extend keeps the rows appended before the generator raises
+        rows.extend(
+            (intern(key), value)
+            for key, value in process_json_data(
+                data, path.stem, separator, index_format, validate_keys
+            )
+        )
+    except (ValueError, OSError) as error:
+        return rows, str(error)
+    return rows, None
+
 
 # CSV WRITER
 
 
-def write_csv(data: Generator[Tuple[str, Any], None, None], path: Path) -> int:
+def _csv_field(value: Any) -> str:
+    """Render a value as a CSV field, quoting it only when required"""
+    if value is None:
+        return ""
+    text = value if isinstance(value, str) else str(value)
+    if _QUOTE_RE.search(text) is None:
+        return text
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _encode_batch(keys: List[str], values: List[Any]) -> bytes:
+    """Encode a batch of sanitized keys and their values as CSV rows"""
+    # Sanitized keys can only need quoting because of a double quote,
+    # numbers and booleans never need quoting, and plain strings are
+    # written as-is; only the remaining values go through _csv_field
+    quote_search = _QUOTE_RE.search
+    key_fields = [key if '"' not in key else _csv_field(key) for key in keys]
+    value_fields = [
+        str(value)
+        if value.__class__ in _PLAIN_TYPES
+        else (
+            value
+            if value.__class__ is str and quote_search(value) is None
+            else _csv_field(value)
+        )
+        for value in values
+    ]
+    rows = "\r\n".join(map(",".join, zip(key_fields, value_fields)))
+    return (rows + "\r\n").encode("utf-8")
+
+
+def write_csv(
+    data: Generator[Tuple[str, Any], None, None],
+    path: Path,
+    buffer_size: int = WRITE_BUFFER_SIZE,
+    durable: bool = False,
+) -> int:
     """Writes flattened JSON data to a CSV file"""
+    # Pull the first row before touching the output path, so an existing
+    # file is left alone when there is nothing to write
+    data = iter(data)
+    first = next(data, None)
+    if first is None:
+        raise ValueError("No valid data to write!")
+    data = itertools.chain((first,), data)
+
     row_count = 0
     try:
-        path.parent.mkdir(parents=True, exist_ok=True)
+        if not path.parent.is_dir():
+            path.parent.mkdir(parents=True, exist_ok=True)
 
-        with path.open("w", newline="", encoding="utf-8-sig") as file:
-            writer = csv.writer(file)
-            writer.writerow(CSV_HEADERS)
+        with path.open("wb", buffering=buffer_size) as file:
+            file.write(codecs.BOM_UTF8)
+            file.write(",".join(CSV_HEADERS).encode("utf-8") + b"\r\n")
 
+            keys = []
+            values = []
             for key, value in data:
-                sanitized_key = key.replace(",", "_")
-                writer.writerow([sanitized_key, value])
-                row_count += 1
-
-        if row_count == 0:
-            raise ValueError("No valid data to write!")
+                keys.append(
+                    key
+                    if _FORBIDDEN_RE.search(key) is None
+                    else key.translate(_SANITIZE_TABLE)
+                )
+                values.append(value)
+                if len(keys) >= CSV_BATCH_SIZE:
+                    file.write(_encode_batch(keys, values))
+                    row_count += len(keys)
+                    keys.clear()
+                    values.clear()
+
+            if keys:
+                file.write(_encode_batch(keys, values))
+                row_count += len(keys)
+
+            # A single fsync once everything is written, never per row
+            if durable:
+                file.flush()
+                os.fsync(file.fileno())
 
     except IOError as error:
         raise IOError(f"Failed to write to {path}: {error}")
@@ -285,28 +629,73 @@ def run() -> None:
         print(f"Initialization failed! {error}")
         sys.exit(1)
 
-    all_data = []
-    for json_file in json_files:
-        try:
-            data = load_json_data(json_file)
-            rows = process_json_data(
-                data,
-                json_file.stem,
+    jobs = args.jobs or os.cpu_count() or 1
+
+    def iter_all() -> Generator[Tuple[str, Any], None, None]:
+        """Stream flattened rows from every JSON file in turn"""
+        if jobs > 1 and len(json_files) > 1:
+            yield from iter_parallel()
+            return
+
+        for json_file in json_files:
+            try:
+                data = load_json_data(json_file)
+                yield from process_json_data(
+                    data,
+                    json_file.stem,
+                    args.separator,
+                    args.index_format,
+                    args.validate_keys,
+                )
+            except (ValueError, OSError) as error:
+                print(f"Skipping {json_file}: {error}")
+                continue
+
+    def iter_parallel() -> Generator[Tuple[str, Any], None, None]:
+        """Parse files in worker processes, yielding rows in file order"""
+        # Imported here so serial runs do not pay for it at startup
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Forked pools start every worker on the first submit
+        executor = ProcessPoolExecutor(max_workers=min(jobs, len(json_files)))
+        queued_files = iter(json_files)
+        pending = deque()
+
+        def submit_next() -> None:
+            json_file = next(queued_files, None)
+            if json_file is None:
+                return
+            future = executor.submit(
+                convert_json_file,
+                json_file,
                 args.separator,
                 args.index_format,
                 args.validate_keys,
             )
-            all_data.extend(rows)
-        except ValueError as error:
-            print(f"Skipping {json_files}: {error}")
-            continue
+            pending.append((json_file, future))
 
-    if not all_data:
-        print("No valid data found. Exiting...")
-        sys.exit(1)
+        # Keep only about `jobs` parsed files in memory at a time
+        try:
+            for _ in range(jobs):
+                submit_next()
+
+            while pending:
+                json_file, future = pending.popleft()
+                rows, error = future.result()
+                submit_next()
+                yield from rows
+                if error is not None:
+                    print(f"Skipping {json_file}: {error}")
+        finally:
+            # Do not wait for queued files if the writer gave up early
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown()
 
     try:
-        row_count = write_csv(all_data, output_path)
+        row_count = write_csv(
+            iter_all(), output_path, args.write_buffer, args.durable
+        )
         print(f"Successfully wrote {row_count} rows to {output_path}")
 
     except (FileNotFoundError, ValueError, IOError) as error: